@@ -1,11 +1,99 @@
 import numpy as np
 from skimage.feature import canny
-from skimage.transform import rotate
+from scipy.ndimage import map_coordinates
 import fitsio
 import multiprocessing
 
 
-def detect_phi_arm(x,y,image,template,ang_step=1.,plot=False) :
+def _template_mask(template) :
+    """
+    circular mask of the template footprint
+    """
+    pad=template.shape[0]//2
+    xgrid, ygrid = np.mgrid[-pad:pad+1,-pad:pad+1]
+    return ((xgrid**2 + ygrid**2) < pad**2)
+
+def rotate_template(template,ang_step=1.) :
+    """
+    computes the rotated templates used in the phi arm angle scan
+
+    Args:
+     template: 2D np.array : template
+     ang_step: float, step in degree of azimuthal angle scan
+
+    returns 3D np.array of shape (360/ang_step,)+template.shape,
+    with the masked and normalized template rotated by -i*ang_step degrees
+    in slice i (same as skimage.transform.rotate with bilinear interpolation).
+    """
+    assert(template.shape[0] == template.shape[1])
+    template = template*_template_mask(template)
+    template /= np.linalg.norm(template)
+    angles = np.arange(0, 360, ang_step)
+    nang = len(angles)
+
+    # rotations by multiples of 90 deg are exact on the pixel grid,
+    # so we only need to interpolate the first quadrant if ang_step divides 90
+    nquad = int(np.round(90./ang_step))
+    use_symmetry = (np.abs(nquad*ang_step-90.)<1e-9) and (nang == 4*nquad)
+    if use_symmetry :
+        angles = angles[:nquad]
+    angles = np.deg2rad(-angles)
+
+    # coordinates in the input template of the pixels of all the rotated templates,
+    # rotation around the center of the template
+    nrows, ncols = template.shape
+    yc = (nrows-1)/2.
+    xc = (ncols-1)/2.
+    dy, dx = np.indices(template.shape, dtype=float)
+    dy -= yc
+    dx -= xc
+    cosa = np.cos(angles)[:,None,None]
+    sina = np.sin(angles)[:,None,None]
+    xin = cosa*dx - sina*dy + xc
+    yin = sina*dx + cosa*dy + yc
+
+    # one single interpolation call for all angles
+    rotated = map_coordinates(template, [yin.ravel(), xin.ravel()], order=1, mode='constant', cval=0.)
+    rotated = rotated.reshape((len(angles), ) + template.shape)
+    if not use_symmetry :
+        return rotated
+
+    templates = np.zeros((nang, ) + template.shape, dtype=template.dtype)
+    for k in range(4) :
+        templates[k*nquad:(k+1)*nquad] = np.rot90(rotated, -k, axes=(1,2))
+    return templates
+
+def normalized_stamps(x,y,image,pad) :
+    """
+    extracts and normalizes stamps around fiber tips
+
+    Args:
+     x: 1D np.array, x pixel coordinates of fiber tips
+     y: 1D np.array, y pixel coordinates of fiber tips
+     image: 2D np.array : bright image
+     pad: int, half size of stamps
+
+    returns stamps, mean_image with stamps a 3D np.array of shape (x.size,2*pad+1,2*pad+1),
+    with the median subtracted and divided by the rms, and mean_image the mean of the
+    image in each stamp (before normalization).
+    """
+    curx = np.round(x).astype(int)
+    cury = np.round(y).astype(int)
+    size = 2*pad+1
+    if np.any((curx<pad)|(cury<pad)|(curx>=image.shape[1]-pad)|(cury>=image.shape[0]-pad)) :
+        raise ValueError("stamps have to be fully inside the image")
+    # read-only view of all the stamps of the image, indexed by the lower corner
+    # (np.lib.stride_tricks.sliding_window_view requires numpy>=1.20)
+    windows = np.lib.stride_tricks.as_strided(image,shape=(image.shape[0]-size+1,image.shape[1]-size+1,size,size),strides=image.strides*2,writeable=False)
+    stamps = windows[cury-pad,curx-pad].astype(float)
+    mean_image = np.mean(stamps,axis=(1,2))
+
+    stamps -= np.median(stamps,axis=(1,2),keepdims=True)
+    stamps /= np.std(stamps,axis=(1,2),keepdims=True)
+
+    return stamps, mean_image
+
+def detect_phi_arm(x,y,image,template,ang_step=1.,plot=False,templates=None) :
     """
     detection of phi arm angle
 
@@ -16,26 +104,38 @@ def detect_phi_arm(x,y,image,template,ang_step=1.,plot=False) :
      template: 2D np.array : template
      ang_step: float, step in degree of azimuthal angle scan
 
+    Optional:
+     templates: 3D np.array, rotated templates as returned by rotate_template(template,ang_step),
+                computed if None. Scanned angles are multiples of ang_step.
+
     returns angle, ccfval with angle in radians and ccfval the cross
     correlation coefficient
     """
 
     assert(template.shape[0] == template.shape[1])
     pad=template.shape[0]//2
+    if templates is None :
+        templates = rotate_template(template,ang_step)
+    stamps, mean_image = normalized_stamps(np.atleast_1d(x),np.atleast_1d(y),image,pad)
+    return detect_phi_arm_in_stamp(stamps[0],mean_image[0],templates,ang_step,plot=plot,title="x={} y={}".format(int(np.round(x)),int(np.round(y))))
 
-    curx = int(np.round(x))
-    cury = int(np.round(y))
-    stamp = image[cury-pad : cury+pad+1, curx-pad : curx+pad+1 ].copy()
-    mean_image = np.mean(stamp)
+def detect_phi_arm_in_stamp(stamp,mean_image,templates,ang_step=1.,plot=False,title=None) :
+    """
+    detection of phi arm angle in a normalized stamp
 
-    stamp -= np.median(stamp)
-    stamp /= np.std(stamp)
+    Args:
+     stamp: 2D np.array : stamp centered on the fiber tip, as returned by normalized_stamps
+     mean_image: float, mean of image in stamp, returned as is
+     templates: 3D np.array, rotated templates as returned by rotate_template(template,ang_step)
+     ang_step: float, step in degree of azimuthal angle scan
 
-    xgrid, ygrid = np.mgrid[-pad:pad+1,-pad:pad+1]
-    mask = ((xgrid**2 + ygrid**2) < pad**2)
+    returns same as detect_phi_arm
+    """
+    nang = templates.shape[0]
+    # one row per angle, so that the cross-correlations are matrix-vector products
+    templates_flat = templates.reshape(nang, -1)
 
-    template *= mask
-    template /=np.sqrt(np.sum(template**2))
+    mask = _template_mask(stamp)
 
     best_angle = []
     best_ccf = []
@@ -51,33 +151,31 @@ def detect_phi_arm(x,y,image,template,ang_step=1.,plot=False) :
     for canny_sigma in [0.1,0.2,0.5,1.,1.5] :
         edges = canny(stamp, sigma=canny_sigma).astype(float)
         edges *= mask
-        norm = np.sqrt(np.sum(edges**2))
+        norm = np.linalg.norm(edges)
         edges /= norm
+        edges_flat = edges.ravel()
 
-        coarse_step = 5.
-        coarse_angles = np.arange(0, 360, coarse_step)
-        templates = np.zeros((len(coarse_angles), ) + template.shape, dtype=template.dtype)
-        for i, ang in enumerate(coarse_angles):
-            templates[i] = rotate(template, -ang)
-        coarse_ccf = (templates * edges[None, :, :]).sum(axis=1).sum(axis=1)
+        # the angles are rounded to the multiples of ang_step of the rotated templates
+        coarse_k = np.round(coarse_angles/ang_step).astype(int)
+        coarse_ccf = templates_flat[coarse_k%nang].dot(edges_flat)
         pos = np.argmax(coarse_ccf)
 
-        xx.append(coarse_angles)
+        xx.append(coarse_k*ang_step)
         yy.append(coarse_ccf)
 
-        # rerun with finer grid
-        angle = coarse_angles[pos]
-        angles = np.arange(angle-2*coarse_step, angle+2*coarse_step+ang_step, ang_step)
-        templates = np.zeros((len(angles), ) + template.shape, dtype=template.dtype)
-        for i, ang in enumerate(angles):
-            templates[i] = rotate(template, -ang)
-        ccf = (templates * edges[None, :, :]).sum(axis=1).sum(axis=1)
+        # rerun with finer grid, one entry per template
+        kmin = int(np.round((coarse_k[pos]*ang_step-2*coarse_step)/ang_step))
+        kmax = int(np.round((coarse_k[pos]*ang_step+2*coarse_step)/ang_step))
+        fine_k = np.arange(kmin, kmax+1)
+        angles = fine_k*ang_step
+        indices = fine_k%nang
+        ccf = templates_flat[indices].dot(edges_flat)
         pos = np.argmax(ccf)
         best_ccf.append(ccf[pos])
         mean_ccf.append(np.mean(ccf))
         rms_ccf.append(np.std(ccf))
         best_angle.append(angles[pos])
-        best_rtemp.append(templates[pos])
+        best_rtemp.append(templates[indices[pos]])
 
     bb = np.argmax(best_ccf)
     best_edges = best_rtemp[bb]
@@ -90,7 +188,7 @@ def detect_phi_arm(x,y,image,template,ang_step=1.,plot=False) :
     if plot :
         import matplotlib.pyplot as plt
         plt.figure()
-        plt.subplot(231,title="x={} y={}".format(curx,cury))
+        plt.subplot(231,title=title)
         plt.imshow(stamp,origin=0,vmax=3*np.std(stamp))
         plt.subplot(232)
         plt.imshow(edges,origin=0)
@@ -107,19 +205,33 @@ def detect_phi_arm(x,y,image,template,ang_step=1.,plot=False) :
 
     return angle, ccfval, meanccf, rmsccf, mean_image, norm, chi2
 
-def detect_phi_arm_with_index(index,x,y,image,template,ang_step,plot=False) :
-    angle, ccfval, meanccf, rmsccf, mean_image, norm, chi2 = detect_phi_arm(x,y,image,template,ang_step,plot=plot)
+def detect_phi_arm_with_index(index,x,y,image,template,ang_step,plot=False,templates=None) :
+    angle, ccfval, meanccf, rmsccf, mean_image, norm, chi2 = detect_phi_arm(x,y,image,template,ang_step,plot=plot,templates=templates)
     return index,angle,ccfval, meanccf, rmsccf, mean_image, norm, chi2
 
+# rotated templates shared by the multiprocessing.Pool workers,
+# set once per worker by _init_worker instead of being sent with each task
+_worker_templates = None
+_worker_ang_step = None
+
+def _init_worker(templates,ang_step) :
+    """ Used for multiprocessing.Pool """
+    global _worker_templates, _worker_ang_step
+    _worker_templates = templates
+    _worker_ang_step = ang_step
+
 def _func(arg) :
     """ Used for multiprocessing.Pool """
-    index, angle, ccfval, meanccf, rmsccf, mean_image, norm, chi2= detect_phi_arm_with_index(**arg)
+    index = arg.pop("index")
+    angle, ccfval, meanccf, rmsccf, mean_image, norm, chi2 = detect_phi_arm_in_stamp(templates=_worker_templates,ang_step=_worker_ang_step,**arg)
     print("{} angle={:4.1f} ccf={:4.3f}".format(index,angle,ccfval))
     return index, angle, ccfval, meanccf, rmsccf, mean_image, norm, chi2
 
 def detect_phi_arms(spots,image_filename,template_filename,ang_step=1.,nproc=1,plot=False) :
 
     template = fitsio.read(template_filename).astype(float)
+    # rotate the template once for all detections
+    templates = rotate_template(template,ang_step)
 
     image = None
     fits=fitsio.FITS(image_filename)
@@ -144,27 +256,47 @@ def detect_phi_arms(spots,image_filename,template_filename,ang_step=1.,nproc=1,p
 
     ndet=len(det)
 
+    pad=template.shape[0]//2
+    xpix=np.array(det["XPIX"])
+    ypix=np.array(det["YPIX"])
+
+    pool = None
     if nproc > 1 :
-        pool = multiprocessing.Pool(nproc)
-        func_args = []
-        for i in range(ndet) :
-            arguments={"index":i,"x":det["XPIX"][i],"y":det["YPIX"][i],"image":image,"template":template,"ang_step":ang_step}
-            func_args.append( arguments )
-        results  =  pool.map(_func, func_args)
-        pool.close()
-        pool.join()
-        for result in results :
-            i=result[0]
-            det['ANGLE'][i]=result[1]
-            det['CCF'][i]=result[2]
-            det['MCCF'][i]=result[3]
-            det['RMSCCF'][i]=result[4]
-            det['MIMAGE'][i]=result[5]
-            det['NORM'][i]=result[6]
-            det['CHI2'][i]=result[7]
-
-
-    else :
-        for i in range(ndet) :
-            det['ANGLE'][i], det['CCF'][i], det['MCCF'][i], det['RMSCCF'][i], det['MIMAGE'][i], det['NORM'][i], det['CHI2'][i] = detect_phi_arm(det["XPIX"][i],det["YPIX"][i],image,template,ang_step=ang_step,plot=plot)
-            print("{}/{} angle={:4.1f} ccf={:4.3f}".format(i,ndet,det['ANGLE'][i], det['CCF'][i]))
+        pool = multiprocessing.Pool(nproc,initializer=_init_worker,initargs=(templates,ang_step))
+
+    # the pool is terminated if the detection fails
+    try :
+        # the normalized stamps are computed for blocks of detections
+        # to keep the memory usage small for a full focal plane
+        block_size = 512
+        for begin in range(0,ndet,block_size) :
+            end = min(begin+block_size,ndet)
+            stamps, mean_image = normalized_stamps(xpix[begin:end],ypix[begin:end],image,pad)
+
+            if nproc > 1 :
+                func_args = []
+                for i in range(begin,end) :
+                    arguments={"index":i,"stamp":stamps[i-begin],"mean_image":mean_image[i-begin]}
+                    func_args.append( arguments )
+                results  =  pool.map(_func, func_args, chunksize=max(1,(end-begin)//(4*nproc)))
+                for result in results :
+                    i=result[0]
+                    det['ANGLE'][i]=result[1]
+                    det['CCF'][i]=result[2]
+                    det['MCCF'][i]=result[3]
+                    det['RMSCCF'][i]=result[4]
+                    det['MIMAGE'][i]=result[5]
+                    det['NORM'][i]=result[6]
+                    det['CHI2'][i]=result[7]
+
+            else :
+                for i in range(begin,end) :
+                    det['ANGLE'][i], det['CCF'][i], det['MCCF'][i], det['RMSCCF'][i], det['MIMAGE'][i], det['NORM'][i], det['CHI2'][i] = detect_phi_arm_in_stamp(stamps[i-begin],mean_image[i-begin],templates,ang_step=ang_step,plot=plot,title="x={} y={}".format(int(np.round(xpix[i])),int(np.round(ypix[i]))))
+                    print("{}/{} angle={:4.1f} ccf={:4.3f}".format(i,ndet,det['ANGLE'][i], det['CCF'][i]))
+
+        if pool is not None :
+            pool.close()
+            pool.join()
+    finally :
+        if pool is not None :
+            pool.terminate()
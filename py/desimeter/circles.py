@@ -64,6 +64,151 @@ def fit_circle(x, y):
 
     return xc_2b, yc_2b, R_2b
 
+def fit_circles(x, y, starts, ends, niter=20, max_center_error=0.1):
+    """
+    Fit circles to several sets of 2D cartesian coordinates at once.
+
+    The points of set i are x[starts[i]:ends[i]], y[starts[i]:ends[i]].
+    Each set is fitted as with fit_circle, with the same initial estimate,
+    the same cost and the same rejection of bad fits, but with Gauss-Newton
+    iterations of all sets done together with vectorized operations.
+    The sets for which the iterations do not converge, and the poorly constrained
+    sets (such as short arcs with a large residual scatter) are fitted with fit_circle.
+    Contrary to fit_circle, no exception is raised for bad fits, the sets rejected
+    by fit_circle and the sets with less than 3 points get NaN.
+
+    Args:
+        x : float numpy array of coordinates along first axis of cartesian coordinate system
+        y : float numpy array of coordinates along second axis in same system
+        starts : integer numpy array, index of the first point of each set
+        ends : integer numpy array, index after the last point of each set
+        niter : maximum number of Gauss-Newton iterations
+        max_center_error : sets with a larger uncertainty on the center, estimated from
+                           the residual scatter, are fitted with fit_circle
+
+    Returns:
+        xc : float numpy array, coordinates along first axis of centers of circles
+        yc : float numpy array, coordinates along second axis of centers of circles
+        r  : float numpy array, radii of circles
+    """
+    xin = np.asarray(x, dtype=float)
+    yin = np.asarray(y, dtype=float)
+    starts = np.asarray(starts, dtype=int)
+    ends = np.asarray(ends, dtype=int)
+    nsets = starts.size
+    npts = ends - starts
+
+    # set index and position in input arrays of all the points
+    first = np.cumsum(npts) - npts
+    group = np.repeat(np.arange(nsets), npts)
+    local = np.arange(np.sum(npts)) - first[group]
+    x = xin[starts[group] + local]
+    y = yin[starts[group] + local]
+
+    def _sum(values):
+        return np.bincount(group, weights=values, minlength=nsets)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = npts.astype(float)
+
+        # initial estimate of each set, same as _fast_fit_circle
+        n_of_point = npts[group]
+        i2 = first[group] + (local + n_of_point//2 - 1) % n_of_point
+        mx = (x + x[i2])/2.
+        my = (y + y[i2])/2.
+        nx = y[i2] - y
+        ny = -(x[i2] - x)
+        num = ny[i2]*mx[i2] - nx[i2]*my[i2] - ny[i2]*mx + nx[i2]*my
+        denom = ny[i2]*nx - nx[i2]*ny
+        ok = (denom != 0)
+        s1 = np.zeros(x.size)
+        s1[ok] = num[ok]/denom[ok]
+        xc0 = _sum(mx + nx*s1)/n
+        yc0 = _sum(my + ny*s1)/n
+        r0 = _sum(np.hypot(x - xc0[group], y - yc0[group]))/n
+
+        # same rejection of the initial estimate as fit_circle
+        fit = (npts >= 3) & (r0 >= 1.0) & (r0 <= 5.0)
+
+        # geometric fit, minimizing the scatter of distances to the center,
+        # with coordinates relative to the initial center
+        u = x - xc0[group]
+        v = y - yc0[group]
+        uc = np.zeros(nsets)
+        vc = np.zeros(nsets)
+
+        def _residuals(uc, vc):
+            du = uc[group] - u
+            dv = vc[group] - v
+            ri = np.hypot(du, dv)
+            res = ri - (_sum(ri)/n)[group]
+            return du, dv, ri, res
+
+        du, dv, ri, res = _residuals(uc, vc)
+        cost = _sum(res*res)
+        active = fit.copy()
+        converged = np.zeros(nsets, dtype=bool)
+        for _ in range(niter) :
+            if not np.any(active) :
+                break
+            ju = du/ri
+            jv = dv/ri
+            ju -= (_sum(ju)/n)[group]
+            jv -= (_sum(jv)/n)[group]
+            auu = _sum(ju*ju)
+            avv = _sum(jv*jv)
+            auv = _sum(ju*jv)
+            bu = _sum(ju*res)
+            bv = _sum(jv*res)
+            det = auu*avv - auv**2
+            step_u = np.where(active, (avv*bu - auv*bv)/det, 0.)
+            step_v = np.where(active, (auu*bv - auv*bu)/det, 0.)
+            new_du, new_dv, new_ri, new_res = _residuals(uc - step_u, vc - step_v)
+            new_cost = _sum(new_res*new_res)
+            # stop (and use fit_circle) for the sets where the cost does not decrease
+            diverging = active & ~(new_cost <= cost*(1 + 1e-9))
+            accepted = active & ~diverging
+            uc[accepted] -= step_u[accepted]
+            vc[accepted] -= step_v[accepted]
+            cost[accepted] = new_cost[accepted]
+            done = accepted & (np.abs(step_u) + np.abs(step_v) < 1e-10)
+            converged |= done
+            active &= ~(diverging | done)
+            du, dv, ri, res = _residuals(uc, vc)
+
+        r = _sum(ri)/n
+
+        # uncertainty on the center from the residual scatter
+        # and the smallest eigenvalue of the normal matrix
+        ju = du/ri
+        jv = dv/ri
+        ju -= (_sum(ju)/n)[group]
+        jv -= (_sum(jv)/n)[group]
+        auu = _sum(ju*ju)
+        avv = _sum(jv*jv)
+        auv = _sum(ju*jv)
+        lmin = (auu + avv)/2 - np.sqrt(((auu - avv)/2)**2 + auv**2)
+        center_error = np.sqrt(_sum(res*res)/(n - 3)/lmin)
+        constrained = (center_error <= max_center_error)
+
+    xc = uc + xc0
+    yc = vc + yc0
+
+    # the sets that did not converge or are poorly constrained are fitted one by one
+    for i in np.where(fit & ~(converged & constrained))[0] :
+        try :
+            xc[i], yc[i], r[i] = fit_circle(xin[starts[i]:ends[i]], yin[starts[i]:ends[i]])
+        except ValueError :
+            r[i] = np.nan
+
+    # same rejection of the final fit as fit_circle
+    bad = ~(fit & (r >= 1.0) & (r <= 5.0))
+    xc[bad] = np.nan
+    yc[bad] = np.nan
+    r[bad] = np.nan
+
+    return xc, yc, r
+
 def _fast_fit_circle(x,y,use_median=False) :
     """
     Fast and approximate method to fit a circle from a set of 2D cartesian coordinates (better use fit_circle).
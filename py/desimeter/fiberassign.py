@@ -30,9 +30,12 @@ log = desimeter.log.get_logger()
 
 def _measure_fieldrot_deg(ha,dec,tel_ha,tel_dec,xfp_mm,yfp_mm) :
 
-    ok = (~(np.isnan(ha*dec*xfp_mm*yfp_mm)))&(xfp_mm**2+yfp_mm**2>10**2)
+    r2 = xfp_mm*xfp_mm+yfp_mm*yfp_mm
+    ok = (~(np.isnan(ha*dec*r2)))&(r2>10**2)
+    x1 = xfp_mm[ok]
+    y1 = yfp_mm[ok]
     x2,y2=hadec2xy(ha[ok],dec[ok],tel_ha,tel_dec) # rad
-    return np.rad2deg(np.mean((yfp_mm[ok]*x2-xfp_mm[ok]*y2)/np.sqrt((xfp_mm[ok]**2+yfp_mm[ok]**2)*(x2**2+y2**2))))
+    return np.rad2deg(np.mean((y1*x2-x1*y2)/np.sqrt(r2[ok]*(x2*x2+y2*y2))))
 
 
 # This comes straight from PlateMaker: python/PlateMaker/astron.py
@@ -55,7 +58,8 @@ def pm_psi(ha, dec, latitude):
     rha = np.deg2rad(ha)
     rdec = np.deg2rad(dec)
     rphi = np.deg2rad(latitude)
-    rpsi = np.arctan2(np.sin(rha) * np.cos(rphi), np.cos(rdec) * np.sin(rphi) - np.sin(rdec) * np.cos(rphi) * np.cos(rha))
+    cphi = np.cos(rphi)
+    rpsi = np.arctan2(np.sin(rha) * cphi, np.cos(rdec) * np.sin(rphi) - np.sin(rdec) * cphi * np.cos(rha))
     return np.rad2deg(rpsi)
 
 def pm_zd2deltaadc(zd):
@@ -80,6 +84,44 @@ def pm_get_adc_angles(ha, dec):
     adc2 = psi - dadc/2.
     return adc1, adc2
 
+def _tune_telescope_pointing(tile_ra,tile_dec,tile_mjd,lst,adc1,adc2) :
+    """Telescope pointing such that the tile center is at X=0,Y=0 in the focal plane
+    (it's not the tile center because of the ADC angles).
+    All arguments in degrees (except tile_mjd), returns tel_ra,tel_dec in degrees.
+    """
+    # start with pointing = tile center
+    tel_ra=tile_ra+0.
+    tel_dec=tile_dec+0.
+
+    # tile center and offsets in RA and Dec for the numeric derivatives,
+    # transformed together in a single call
+    eps = 1./3600. #
+    ra  = tile_ra  + np.array([0.,eps,0.])
+    dec = tile_dec + np.array([0.,0.,eps])
+
+    for _ in range(2) :
+
+        xtan,ytan = radec2tan(ra,dec,tel_ra,tel_dec,tile_mjd,lst,hexrot_deg=0)
+        xfp,yfp   = tan2fp(xtan,ytan,adc1,adc2) #mm
+        #log.info("Temp tile center in FP coordinates = {},{} mm".format(xfp[0],yfp[0]))
+
+        # numeric derivative
+        dxdra=(xfp[1]-xfp[0])/eps
+        dydra=(yfp[1]-yfp[0])/eps
+        dxddec=(xfp[2]-xfp[0])/eps
+        dyddec=(yfp[2]-yfp[0])/eps
+
+        # solve 2x2 linear system J.(dra,ddec) = (xfp,yfp) to get tile RA Dec at center of fov
+        det=dxdra*dyddec-dxddec*dydra
+        dra=(dyddec*xfp[0]-dxddec*yfp[0])/det
+        ddec=(dxdra*yfp[0]-dydra*xfp[0])/det
+
+        # apply offset to telescope pointing
+        tel_ra += dra
+        tel_dec += ddec
+
+    return tel_ra,tel_dec
+
 def fiberassign_radec2xy_cs5(ra,dec,tile_ra,tile_dec,tile_mjd,tile_ha,tile_fieldrot,adc1=None,adc2=None,to_platemaker=True) :
     """Computes X Y focal plane coordinates of targets in CS5 coordinate system.
     Args:
@@ -107,39 +149,7 @@ def fiberassign_radec2xy_cs5(ra,dec,tile_ra,tile_dec,tile_mjd,tile_ha,tile_field
     if adc1 is None :
         adc1,adc2 =  pm_get_adc_angles(tile_ha,tile_dec)
 
-    # start with pointing = tile center
-    tel_ra=tile_ra+0.
-    tel_dec=tile_dec+0.
-
-    # tune telescope pointing given ADC angle
-    # in order to fp coordinates of tile RA and DEC, it's not zero because of the ADC angles
-    for _ in range(2) :
-
-        xtan,ytan = radec2tan(np.array([tile_ra]),np.array([tile_dec]),tel_ra,tel_dec,tile_mjd,lst,hexrot_deg=0)
-        xfp_0,yfp_0   = tan2fp(xtan,ytan,adc1,adc2) #mm
-        #log.info("Temp tile center in FP coordinates = {},{} mm".format(xfp_0[0],yfp_0[0]))
-
-        # numeric derivative
-        eps = 1./3600. #
-        xtan,ytan = radec2tan(np.array([tile_ra+eps]),np.array([tile_dec]),tel_ra,tel_dec,tile_mjd,lst,hexrot_deg=0)
-        xfp_dra,yfp_dra   = tan2fp(xtan,ytan,adc1,adc2) #mm
-        xtan,ytan = radec2tan(np.array([tile_ra]),np.array([tile_dec+eps]),tel_ra,tel_dec,tile_mjd,lst,hexrot_deg=0)
-        xfp_ddec,yfp_ddec   = tan2fp(xtan,ytan,adc1,adc2) #mm
-        dxdra=(xfp_dra[0]-xfp_0[0])/eps
-        dydra=(yfp_dra[0]-yfp_0[0])/eps
-        dxddec=(xfp_ddec[0]-xfp_0[0])/eps
-        dyddec=(yfp_ddec[0]-yfp_0[0])/eps
-        J=[[dxdra,dxddec],[dydra,dyddec]]
-
-        # solve linear system to get tile RA Dec at center of fov
-        Jinv=np.linalg.inv(J)
-        X=Jinv.dot([xfp_0[0],yfp_0[0]])
-        dra=X[0]
-        ddec=X[1]
-
-        # apply offset to telescope pointing
-        tel_ra += dra
-        tel_dec += ddec
+    tel_ra,tel_dec = _tune_telescope_pointing(tile_ra,tile_dec,tile_mjd,lst,adc1,adc2)
 
     # verify
     xtan,ytan = radec2tan(np.array([tile_ra]),np.array([tile_dec]),tel_ra,tel_dec,tile_mjd,lst,hexrot_deg=0)
@@ -197,39 +207,7 @@ def fiberassign_cs5_xy2radec(xfp,yfp,tile_ra,tile_dec,tile_mjd,tile_ha,tile_fiel
     if adc1 is None :
         adc1,adc2 =  pm_get_adc_angles(tile_ha,tile_dec)
 
-    # start with pointing = tile center
-    tel_ra=tile_ra+0.
-    tel_dec=tile_dec+0.
-
-    # tune telescope pointing given ADC angle
-    # in order to fp coordinates of tile RA and DEC, it's not zero because of the ADC angles
-    for _ in range(2) :
-
-        xtan,ytan = radec2tan(np.array([tile_ra]),np.array([tile_dec]),tel_ra,tel_dec,tile_mjd,lst,hexrot_deg=0)
-        xfp_0,yfp_0   = tan2fp(xtan,ytan,adc1,adc2) #mm
-        #log.info("Temp tile center in FP coordinates = {},{} mm".format(xfp_0[0],yfp_0[0]))
-
-        # numeric derivative
-        eps = 1./3600. #
-        xtan,ytan = radec2tan(np.array([tile_ra+eps]),np.array([tile_dec]),tel_ra,tel_dec,tile_mjd,lst,hexrot_deg=0)
-        xfp_dra,yfp_dra   = tan2fp(xtan,ytan,adc1,adc2) #mm
-        xtan,ytan = radec2tan(np.array([tile_ra]),np.array([tile_dec+eps]),tel_ra,tel_dec,tile_mjd,lst,hexrot_deg=0)
-        xfp_ddec,yfp_ddec   = tan2fp(xtan,ytan,adc1,adc2) #mm
-        dxdra=(xfp_dra[0]-xfp_0[0])/eps
-        dydra=(yfp_dra[0]-yfp_0[0])/eps
-        dxddec=(xfp_ddec[0]-xfp_0[0])/eps
-        dyddec=(yfp_ddec[0]-yfp_0[0])/eps
-        J=[[dxdra,dxddec],[dydra,dyddec]]
-
-        # solve linear system to get tile RA Dec at center of fov
-        Jinv=np.linalg.inv(J)
-        X=Jinv.dot([xfp_0[0],yfp_0[0]])
-        dra=X[0]
-        ddec=X[1]
-
-        # apply offset to telescope pointing
-        tel_ra += dra
-        tel_dec += ddec
+    tel_ra,tel_dec = _tune_telescope_pointing(tile_ra,tile_dec,tile_mjd,lst,adc1,adc2)
 
     if from_platemaker :
         # apply tranformation from desimeter to platemater
@@ -1,4 +1,5 @@
 import os
+import functools
 from pkg_resources import resource_filename
 from astropy.table import Table
 import yaml
@@ -41,15 +42,25 @@ def desimeter_data_dir():
     else :
         return resource_filename('desimeter', 'data')
 
-def load_metrology():
+@functools.lru_cache(maxsize=4)
+def _read_metrology(filename, mtime):
     '''
-    Returns metrology table.
+    Reads and caches the metrology table, the modification time
+    is part of the cache key so that an updated file is read again.
     '''
-    filename = os.path.join(desimeter_data_dir(),'fp-metrology.csv')
     log=get_logger()
     log.debug("loading {}".format(filename))
+    return Table.read(filename)
 
-    metrology = Table.read(filename)
+def load_metrology():
+    '''
+    Returns metrology table.
+
+    The file is parsed once per process (as long as it is not modified),
+    a copy of the table is returned so that it can be modified by the caller.
+    '''
+    filename = os.path.join(desimeter_data_dir(),'fp-metrology.csv')
+    metrology = _read_metrology(filename, os.path.getmtime(filename)).copy()
     return metrology
 
 def load_petal_alignement():
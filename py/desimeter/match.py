@@ -99,7 +99,7 @@ def compute_triangles_with_fixed_orientation(x,y) :
                 triangle_index += 1
     return tk,txyz
 
-def match_same_system(x1,y1,x2,y2,remove_duplicates=True) :
+def match_same_system(x1,y1,x2,y2,remove_duplicates=True,max_distance=None) :
     """
     match two catalogs, assuming the coordinates are in the same coordinate system (no transfo)
     Args:
@@ -108,6 +108,11 @@ def match_same_system(x1,y1,x2,y2,remove_duplicates=True) :
         x2 : float numpy array of coordinates along first axis in same system
         y2 : float numpy array of coordinates along second axis in same system
 
+    Optional:
+        remove_duplicates : if True, keep only the closest of the entries of the first catalog
+                            matched to the same entry of the second catalog
+        max_distance : float, if not None, entries with no match closer than this distance are unmatched
+
     returns:
         indices_2 : integer numpy array. if ii is a index array for entries in the first catalog,
                             indices_2[ii] is the index array of best matching entries in the second catalog.
@@ -119,17 +124,20 @@ def match_same_system(x1,y1,x2,y2,remove_duplicates=True) :
     xy1=np.array([x1,y1]).T
     xy2=np.array([x2,y2]).T
     tree2 = KDTree(xy2)
-    distances,indices_2 = tree2.query(xy1,k=1)
-
-    if remove_duplicates :
-        unique_indices_2 = np.unique(indices_2)
-        n_duplicates = np.sum(indices_2>=0)-np.sum(unique_indices_2>=0)
-        if n_duplicates > 0 :
-            for i2 in unique_indices_2 :
-                jj=np.where(indices_2==i2)[0]
-                if jj.size>1 :
-                    kk=np.argsort(distances[jj])
-                    indices_2[jj[kk[1:]]] = -1
+    if max_distance is None :
+        distances,indices_2 = tree2.query(xy1,k=1)
+    else :
+        distances,indices_2 = tree2.query(xy1,k=1,distance_upper_bound=max_distance)
+        # the tree returns an index equal to the size of the catalog when there is no match
+        indices_2[indices_2==xy2.shape[0]] = -1
+
+    if remove_duplicates and indices_2.size > 1 :
+        # sort by index in second catalog then distance, and unmatch all but the first of each index
+        order = np.lexsort((distances,indices_2))
+        sorted_indices_2 = indices_2[order]
+        duplicates = np.zeros(order.size,dtype=bool)
+        duplicates[1:] = (sorted_indices_2[1:]==sorted_indices_2[:-1])
+        indices_2[order[duplicates]] = -1
 
     distances[indices_2<0] = np.inf
     return indices_2,distances
@@ -171,7 +179,7 @@ def match_arbitrary_translation_dilatation(x1,y1,x2,y2) :
     # now that we have match of triangles , need to match back catalog entries
     ranked_pairs = np.argsort(triangle_distances)
 
-    indices_2 = -1*np.ones(x1.size,dtype=int)
+    indices_2 = np.full(x1.size,-1,dtype=int)
     distances = np.zeros(x1.size)
 
     all_matched = False
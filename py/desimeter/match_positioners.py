@@ -276,8 +276,9 @@ def print_groupings(fvc, metr, assignment, alternatives, file=None,
                         raise AssertionError('cos(theta) > 1?')
                     basetheta = np.arctan2(tfvc0['Y_FP']-tm['Y_FP'],
                                            tfvc0['X_FP']-tm['X_FP'])
-                    xpt = tm['X_FP'] + r1*np.cos(basetheta+np.arccos(ctheta))
-                    ypt = tm['Y_FP'] + r1*np.sin(basetheta+np.arccos(ctheta))
+                    theta = basetheta+np.arccos(ctheta)
+                    xpt = tm['X_FP'] + r1*np.cos(theta)
+                    ypt = tm['Y_FP'] + r1*np.sin(theta)
                 print(metr['DEVICE_ID'][metrind0],
                       tfvc0['X_FP'], tfvc0['Y_FP'], xpt, ypt, len(tfvc),
                       file=file)
@@ -87,11 +87,12 @@ def run_best_fits(posid, path, period_days, data_window, savedir,
     if not np.all(table['RECENT_REHOME']) :
         print("{}: has exposure(s) with RECENT_REHOME=False. Will first initiate the fit without those".format(posid))
         recent_rehome = table['RECENT_REHOME'].astype(int)
-        selection = np.where(recent_rehome>0)[0]
-        print("{}: number of points with RECENT_REHOME=True = {}".format(posid,selection.size))
-        if selection.size < 10 :
+        selection = (recent_rehome>0)
+        nselected = np.count_nonzero(selection)
+        print("{}: number of points with RECENT_REHOME=True = {}".format(posid,nselected))
+        if nselected < 10 :
             write_failed_fit(posid,savedir,flag=movemask["INVALID_AFTER_FILTER"])
-            return 'ERROR: {} dropped from analysis because only {} moves with RECENT_REHOME=True'.format(posid,selection.size)
+            return 'ERROR: {} dropped from analysis because only {} moves with RECENT_REHOME=True'.format(posid,nselected)
         tmp_table = table[selection]
         tmp_cases = _define_cases(tmp_table, datum_dates, data_window, printf=printf)
         static_out = _process_cases(tmp_table, tmp_cases, printf=printf, mode='static',
@@ -319,12 +319,14 @@ def fit_params(posintT, posintP, ptlX, ptlY, gearT, gearP, recent_rehome, sequen
     if mode=='static' :
         # we initialize OFFSET_X and OFFSET_Y by fitting circles
         # for all unique values of p_int
-        unique_p_int = np.unique(p_int)
+        # (one sort of p_int instead of one full scan per value)
+        order = np.argsort(p_int,kind='stable')
+        _, starts, counts = np.unique(p_int[order],return_index=True,return_counts=True)
         offset_x=list()
         offset_y=list()
-        for val in unique_p_int :
-            selection = np.where(p_int==val)[0]
-            if selection.size<3 : continue # no circle to fit here
+        for start,count in zip(starts,counts) :
+            if count<3 : continue # no circle to fit here
+            selection = order[start:start+count]
             try :
                 xc,yc,_,_ = robust_fit_circle(x_flat[selection],y_flat[selection])
                 offset_x.append(xc)
@@ -29,13 +29,15 @@ def eval_move_flags(posintT, posintP, ptlX, ptlY) :
 
 
     # loop over unique values of intP to check T moves
-    unique_p_int = np.unique(p_int)
+    # (one sort of p_int instead of one full scan per value)
+    order = np.argsort(p_int,kind='stable')
+    unique_p_int, starts, counts = np.unique(p_int[order],return_index=True,return_counts=True)
 
     tested = False
     moving = False
     #print("DEBUG: unique P values = {}".format(unique_p_int))
-    for val in unique_p_int :
-        selection = np.where(p_int==val)[0]
+    for val,start,count in zip(unique_p_int,starts,counts) :
+        selection = order[start:start+count]
         if len(selection)<4 :
             #print("DEBUG: for p={} , {} pts: too few points to detect anything".format(val,selection.size))
             continue # too few points to detect anything
@@ -37,7 +37,7 @@ def plot_params(table, savepath, statics_during_dynamic):
     table.sort(DATE_SEC)
     posid = table['POS_ID'][0]
     fig.subplots_adjust(wspace=.3, hspace=.3)
-    times = table[DATE_SEC]
+    times = np.asarray(table[DATE_SEC])
     tick_values, tick_labels = _ticks(times)
     n_pts = len(table)
     marker = ''
@@ -56,7 +56,7 @@ def plot_params(table, savepath, statics_during_dynamic):
                 linestyle = '-'
                 if n_pts == 1:
                     marker = 'v'
-            y = [val * p['mult'] for val in table[key]]#.tolist()]
+            y = np.asarray(table[key], dtype=float) * p['mult']
             plt.plot(times, y, color=color, linestyle=linestyle, marker=marker)
             if not ax_right:
                 ax_left = plt.gca()
@@ -71,7 +71,6 @@ def plot_params(table, savepath, statics_during_dynamic):
                 max_y = max(ax_left.get_ylim()[1], ax_right.get_ylim()[1])
                 ax_left.set_ylim((min_y, max_y))
                 ax_right.set_ylim((min_y, max_y))
-            plt.xticks(tick_values, tick_labels, rotation=90, horizontalalignment='center', fontsize=8)
             plt.yticks(fontsize=8)
             if 'SCALE_P_DYNAMIC' in key:
                 s = statics_during_dynamic
@@ -81,6 +80,11 @@ def plot_params(table, savepath, statics_during_dynamic):
                          f' OFFSET_X = {s["OFFSET_X"]:>8.3f}, OFFSET_Y = {s["OFFSET_Y"]:>8.3f}\n'
                          f' OFFSET_T = {s["OFFSET_T"]:>8.3f}, OFFSET_P = {s["OFFSET_P"]:>8.3f}\n',
                          verticalalignment='bottom', fontfamily='monospace')
+        # x axis is shared with the twin axes, so the ticks are set once per subplot,
+        # after the last plot so that the autoscale does not drop the last tick
+        # (and on the left axes which displays the tick labels)
+        plt.sca(ax_left)
+        plt.xticks(tick_values, tick_labels, rotation=90, horizontalalignment='center', fontsize=8)
     analysis_date = table['ANALYSIS_DATE_DYNAMIC'][-1]
     title = f'{posid}'
     title += f'\nbest-fits to historical data'
@@ -183,60 +187,52 @@ def bin_errors(table, bins=5, mode='static', printf=print):
     bin_ceilings = edges[1:]
     period_duration = day_in_sec
     periods = sorted(set(table[DATE_SEC]))
-    posids = set(table['POS_ID'])
-    subtables = {}
-    for i,period in enumerate(periods):
-        start = period - period_duration
-        if i == 0:
-            after = start <= table[DATE_SEC]
-        else:
-            after = start < table[DATE_SEC]
-        until = period >= table[DATE_SEC]
-        selected = until & after
-        subtables[period] = table[selected]
+    posids = np.array(sorted(set(table['POS_ID'])))
+
+    # sort the needed columns by date, the rows within the window of each
+    # period are then the slice sorted_*[window_starts[i]:window_ends[i]]
+    dates = np.asarray(table[DATE_SEC], dtype=float)
+    order = np.argsort(dates, kind='stable')
+    sorted_dates = dates[order]
+    sorted_cols = np.searchsorted(posids, np.asarray(table['POS_ID'])[order])
+    sorted_errs = np.asarray(table[err_key], dtype=float)[order]
+    sorted_errs[np.isnan(sorted_errs)] = np.inf  # a NaN fit error never passes
+    window_ends = np.searchsorted(sorted_dates, periods, side='right')
+    window_starts = np.searchsorted(sorted_dates, np.array(periods) - period_duration, side='right')
+    # the first window includes its start date
+    window_starts[0] = np.searchsorted(sorted_dates, periods[0] - period_duration, side='left')
+
+    # worst fit error of each POS_ID in each period window (NaN if no data)
+    window_sizes = window_ends - window_starts
+    period_index = np.repeat(np.arange(len(periods)), window_sizes)
+    rows = np.arange(np.sum(window_sizes)) + np.repeat(window_starts - (np.cumsum(window_sizes) - window_sizes), window_sizes)
+    worst = np.full((len(periods), len(posids)), np.nan)
+    np.fmax.at(worst, (period_index, sorted_cols[rows]), sorted_errs[rows])
+
+    # POS_ID without data in a window keep their status from the previous period
+    last_known = np.where(np.isnan(worst), 0, np.arange(len(periods))[:, None])
+    np.maximum.accumulate(last_known, axis=0, out=last_known)
+    worst = worst[last_known, np.arange(len(posids))]
+    known = ~np.isnan(worst)
+
+    # shape (n_ceilings, n_periods, n_posids)
+    pass_mask = worst[None, :, :] <= bin_ceilings[:, None, None]
+    fail_mask = known[None, :, :] & ~pass_mask
     passing = {}
     failing = {}
-    for ceiling in bin_ceilings:
-        passing[ceiling] = {}
-        failing[ceiling] = {}
-        for i,period in enumerate(periods):
-            subtable = subtables[period]
-            pass_selection = subtable[err_key] <= ceiling
-            fail_selection = ~pass_selection
-            pass_set = set(subtable[pass_selection]['POS_ID'])
-            fail_set = set(subtable[fail_selection]['POS_ID'])
-            pass_set -= fail_set  # if two conflicting entries for same posid in that data window
-            if i > 0:
-                known = pass_set | fail_set
-                unknown = posids - known
-                prev_period = periods[i-1]
-                prev_pass_set = passing[ceiling][prev_period]
-                prev_fail_set = failing[ceiling][prev_period]
-                keep_prev_pass = prev_pass_set & unknown
-                keep_prev_fail = prev_fail_set & unknown
-                pass_set |= keep_prev_pass
-                fail_set |= keep_prev_fail
-            passing[ceiling][period] = pass_set
-            failing[ceiling][period] = fail_set
-        printf(f'Pass/fails binned for ceiling {ceiling:.3f} ({bin_ceilings.tolist().index(ceiling) + 1} of {len(bin_ceilings)})')
     passing_counts = {}
     failing_counts = {}
-    total_known = {}
+    total_known = known.sum(axis=1)
     passing_fracs = {}
     failing_fracs = {}
-    for ceiling in bin_ceilings:
-        passing_counts[ceiling] = []
-        failing_counts[ceiling] = []
-        for period in periods:
-            n_pass = len(passing[ceiling][period])
-            n_fail = len(failing[ceiling][period])
-            passing_counts[ceiling].append(n_pass)
-            failing_counts[ceiling].append(n_fail)
-        passing_counts[ceiling] = np.array(passing_counts[ceiling])
-        failing_counts[ceiling] = np.array(failing_counts[ceiling])
-        total_known = passing_counts[ceiling] + failing_counts[ceiling]
+    for c,ceiling in enumerate(bin_ceilings):
+        passing[ceiling] = {period:posids[pass_mask[c,i]].tolist() for i,period in enumerate(periods)}
+        failing[ceiling] = {period:posids[fail_mask[c,i]].tolist() for i,period in enumerate(periods)}
+        passing_counts[ceiling] = pass_mask[c].sum(axis=1)
+        failing_counts[ceiling] = fail_mask[c].sum(axis=1)
         passing_fracs[ceiling] = passing_counts[ceiling] / total_known
         failing_fracs[ceiling] = failing_counts[ceiling] / total_known
+        printf(f'Pass/fails binned for ceiling {ceiling:.3f} ({c + 1} of {len(bin_ceilings)})')
     binned = {'bin_ceilings': bin_ceilings.tolist(),
               'periods': periods,
               'total_known': total_known.tolist(),
@@ -246,9 +242,6 @@ def bin_errors(table, bins=5, mode='static', printf=print):
               'failing_counts': failing_counts,
               'passing_fracs': passing_fracs,
               'failing_fracs': failing_fracs}
-    for key in {'passing', 'failing'}:
-        for ceiling in binned[key]:
-            binned[key][ceiling] = {period:list(posids) for period, posids in binned[key][ceiling].items()}
     for key in {'passing_counts', 'failing_counts', 'passing_fracs', 'failing_fracs'}:
         binned[key] = {ceiling: values.tolist() for ceiling, values in binned[key].items()}
     return binned
@@ -271,16 +264,16 @@ def _ticks(times):
     '''Internal common function to generate tick values and labels, given a
     vector of dates in seconds since epoch.'''
     tick_values = np.arange(times[0], times[-1]+day_in_sec, tick_period_days*day_in_sec)
-    tick_labels = [Time(t, format='unix', out_subfmt='date').iso for t in tick_values]
+    tick_labels = list(Time(tick_values, format='unix').to_value('iso', subfmt='date'))
     return tick_values, tick_labels
 
 def _colors(v):
     '''Generate colors for vector v of scalar values.'''
     V = np.abs(v)
     finite = np.isfinite(V)
-    Vmax = max(V[finite])
-    scaled = V / Vmax * 0.7 + 0.25
-    scaled[~finite] = np.sign(scaled[~finite])
+    Vmax = np.max(V[finite])
+    # non-finite values get hue 0 (same red as the hue 1 they used to get from np.sign(inf))
+    scaled = np.where(finite, V / Vmax * 0.7 + 0.25, 0.0)
     hsv = [(s, 0.7, 0.7) for s in scaled]
     colors = matplotlib.colors.hsv_to_rgb(hsv)
     return colors
@@ -202,6 +202,22 @@ def get_expected_pos(args, log):
     return expected_pos
 
 
+def _match_locations(spots_location, location):
+    """
+    Returns indices ii,jj such that spots_location[ii] == location[jj].
+    If a location appears several times in spots_location, the last spot is used.
+    """
+    spots_location = np.asarray(spots_location)
+    location = np.asarray(location)
+    order = np.argsort(spots_location,kind="stable")
+    sorted_location = spots_location[order]
+    k = np.searchsorted(sorted_location,location,side="right")-1
+    jj = np.where(k>=0)[0]
+    jj = jj[sorted_location[k[jj]]==location[jj]]
+    ii = order[k[jj]]
+    return ii,jj
+
+
 def fvc_proc(args, log):
     """Process an FVC image with options specified by args and output to log.
     """
@@ -213,6 +229,40 @@ def fvc_proc(args, log):
     if spots_list is None:
         return 13
 
+    if not args.nomatch :
+        # the metrology and expected positions are the same for all the images
+        # of a sequence, so they are read once here, with numpy copies
+        # of the columns used for the matching
+        metrology = load_metrology()
+        metrology_location = np.asarray(metrology["LOCATION"])
+        metrology_x_fp = np.asarray(metrology["X_FP"],dtype=float)
+        metrology_y_fp = np.asarray(metrology["Y_FP"],dtype=float)
+
+        if args.use_spotmatch :
+            fit_metrology = metrology.copy()
+            # keep only the center of fiducials
+            selection = (fit_metrology["DEVICE_TYPE"]=="FIF")|(fit_metrology["DEVICE_TYPE"]=="GIF")
+            # all the pinholes at those locations, sorted by location
+            ii = np.where(np.isin(metrology_location,np.unique(metrology_location[selection])))[0]
+            ii = ii[np.argsort(metrology_location[ii],kind="stable")]
+            _, first, counts = np.unique(metrology_location[ii],return_index=True,return_counts=True)
+            # replace first entry of each location by mean of pinholes
+            first_ii = ii[first]
+            mean_xy = np.add.reduceat(np.vstack([metrology_x_fp[ii],metrology_y_fp[ii]]),first,axis=1)/counts
+            fit_metrology["X_FP"][first_ii] = mean_xy[0]
+            fit_metrology["Y_FP"][first_ii] = mean_xy[1]
+            # set a dummy pinhole id = 10 just to make sure it's not interpreted as an existing pinhole
+            fit_metrology["PINHOLE_ID"][first_ii] = 99
+            # drop the others
+            fit_metrology.remove_rows(np.setdiff1d(ii,first_ii))
+        else :
+            fit_metrology = metrology
+
+        expected_pos = get_expected_pos(args, log)
+        expected_location = np.asarray(expected_pos["LOCATION"])
+        expected_x_fp = np.asarray(expected_pos["X_FP"],dtype=float)
+        expected_y_fp = np.asarray(expected_pos["Y_FP"],dtype=float)
+
     for seqid,spots in enumerate(spots_list) :
 
         if args.min_spots is not None :
@@ -252,32 +302,13 @@ def fvc_proc(args, log):
 
         tx = FVC2FP.read_jsonfile(fvc2fp_filename())
 
-        if args.use_spotmatch :
-            metrology = load_metrology()
-            # keep only the center of fiducials
-            selection = (metrology["DEVICE_TYPE"]=="FIF")|(metrology["DEVICE_TYPE"]=="GIF")
-            for loc in np.unique(metrology["LOCATION"][selection]) :
-                # all the pinholes at that location
-                ii = np.where(metrology["LOCATION"]==loc)[0]
-                # replace first entry by mean of pinholes
-                metrology["X_FP"][ii[0]] = np.mean(metrology["X_FP"][ii])
-                metrology["Y_FP"][ii[0]] = np.mean(metrology["Y_FP"][ii])
-                # set a dummy pinhole id = 10 just to make sure it's not interpreted as an existing pinhole
-                metrology["PINHOLE_ID"][ii[0]] = 99
-                # drop the others
-                metrology.remove_rows(ii[1:])
-        else :
-            metrology = None
-
-        tx.fit(spots, metrology=metrology, update_spots=True, zbfit=(args.zbfit), fixed_scale=args.fixed_scale, fixed_rotation=args.fixed_rotation)
-
-        expected_pos = get_expected_pos(args, log)
+        tx.fit(spots, metrology=fit_metrology, update_spots=True, zbfit=(args.zbfit), fixed_scale=args.fixed_scale, fixed_rotation=args.fixed_rotation)
 
         # select spots that are not already matched
         selection  = (spots["LOCATION"]==-1)
 
         if args.use_spotmatch :
-            spots = spotmatch(spots["XPIX"],spots["YPIX"],expected_x_fp=expected_pos["X_FP"],expected_y_fp=expected_pos["Y_FP"],expected_location=expected_pos["LOCATION"],fvc2fp=tx,match_radius_pixels=args.spotmatch_match_radius_pixels)
+            spots = spotmatch(spots["XPIX"],spots["YPIX"],expected_x_fp=expected_x_fp,expected_y_fp=expected_y_fp,expected_location=expected_location,fvc2fp=tx,match_radius_pixels=args.spotmatch_match_radius_pixels)
             #spots = spotmatch(spots["XPIX"],spots["YPIX"],expected_x_fp=expected_pos["X_FP"],expected_y_fp=expected_pos["Y_FP"],expected_location=expected_pos["LOCATION"],fvc2fp=None,match_radius_pixels=args.spotmatch_match_radius_pixels)
 
 
@@ -290,50 +321,45 @@ def fvc_proc(args, log):
             spots["X_FP"],spots["Y_FP"] = tx.fvc2fp(spots["XPIX"],spots["YPIX"])
 
             is_matched = (spots["LOCATION"]>=0)
-            loc2i = {loc:i for i,loc in enumerate(spots["LOCATION"])}
-
-            ii=[]
-            jj=[]
-            for j,loc in enumerate(expected_pos["LOCATION"]) :
-                if loc in loc2i :
-                    ii.append(loc2i[loc])
-                    jj.append(j)
-            spots["X_FP_EXP"][ii]=expected_pos["X_FP"][jj]
-            spots["Y_FP_EXP"][ii]=expected_pos["Y_FP"][jj]
-
-            metrology = load_metrology()
-            ii=[]
-            jj=[]
-            for j,loc in enumerate(metrology["LOCATION"]) :
-                if loc in loc2i :
-                    ii.append(loc2i[loc])
-                    jj.append(j)
-            spots["X_FP_METRO"][ii]=metrology["X_FP"][jj]
-            spots["Y_FP_METRO"][ii]=metrology["Y_FP"][jj]
+
+            ii,jj = _match_locations(spots["LOCATION"],expected_location)
+            spots["X_FP_EXP"][ii]=expected_x_fp[jj]
+            spots["Y_FP_EXP"][ii]=expected_y_fp[jj]
+
+            ii,jj = _match_locations(spots["LOCATION"],metrology_location)
+            spots["X_FP_METRO"][ii]=metrology_x_fp[jj]
+            spots["Y_FP_METRO"][ii]=metrology_y_fp[jj]
 
 
         else :
 
             # match
-            indices_of_expected_pos,distances = match_same_system(spots["X_FP"][selection],spots["Y_FP"][selection],expected_pos["X_FP"],expected_pos["Y_FP"])
-            is_matched = (distances<args.max_match_distance)&(indices_of_expected_pos>=0)
+            indices_of_expected_pos,distances = match_same_system(spots["X_FP"][selection],spots["Y_FP"][selection],expected_x_fp,expected_y_fp,max_distance=args.max_match_distance)
+            is_matched = (indices_of_expected_pos>=0)
             ii=np.where(selection)[0]
             selection[ii]          &=  is_matched
             indices_of_expected_pos = indices_of_expected_pos[is_matched]
             distances               = distances[is_matched]
 
             # add columns after matching fibers
-            for k1,k2 in zip(["X_FP","Y_FP"],["X_FP_EXP","Y_FP_EXP"]) :
-                if k2 not in spots.keys() : spots[k2] = np.zeros(len(spots))
-                spots[k2][selection]=expected_pos[k1][indices_of_expected_pos]
+            # (values are assembled in numpy arrays and each column is set once)
+            for k2,expected_values in zip(["X_FP_EXP","Y_FP_EXP"],[expected_x_fp,expected_y_fp]) :
+                if k2 in spots.keys() :
+                    values = np.array(spots[k2])
+                else :
+                    values = np.zeros(len(spots))
+                values[selection] = expected_values[indices_of_expected_pos]
+                spots[k2] = values
             for k in ["EXP_Q_0","EXP_S_0","PETAL_LOC","DEVICE_LOC","DEVICE_ID","DEVICE_TYPE","LOCATION"] :
                 if k in expected_pos.keys() :
-                    if k not in spots.keys() :
-                        if k in ["DEVICE_ID","DEVICE_TYPE"] :
-                            spots[k] = np.repeat("None           ",len(spots))
-                        else :
-                            spots[k] = np.zeros(len(spots))
-                    spots[k][selection]=expected_pos[k][indices_of_expected_pos]
+                    if k in spots.keys() :
+                        values = np.array(spots[k])
+                    elif k in ["DEVICE_ID","DEVICE_TYPE"] :
+                        values = np.repeat("None           ",len(spots))
+                    else :
+                        values = np.zeros(len(spots))
+                    values[selection] = np.asarray(expected_pos[k])[indices_of_expected_pos]
+                    spots[k] = values
 
 
         if args.expected_positions is not None and ( args.turbulence_correction or args.turbulence_correction_with_pol ):
@@ -0,0 +1,50 @@
+import unittest
+from pkg_resources import resource_filename
+
+import numpy as np
+import fitsio
+from scipy.ndimage import binary_fill_holes
+
+try :
+    from skimage.transform import rotate
+    from desimeter.brightimage import _template_mask,rotate_template,detect_phi_arm
+    have_skimage = True
+except ImportError :
+    have_skimage = False
+
+@unittest.skipIf(not have_skimage, 'scikit-image is not installed')
+class TestBrightImage(unittest.TestCase):
+
+    def test_rotate_template(self):
+        template = fitsio.read(resource_filename('desimeter',"data/fiber_arm_outline.fits")).astype(float)
+        norm_template = template*_template_mask(template)
+        norm_template /= np.linalg.norm(norm_template)
+        for ang_step in [1.,0.7] :
+            templates = rotate_template(template,ang_step)
+            angles = np.arange(0,360,ang_step)
+            assert(templates.shape == (angles.size,)+template.shape)
+            for i in [0,13,90,201,len(angles)-1] :
+                expected = rotate(norm_template,-angles[i])
+                diff = np.max(np.abs(templates[i]-expected))
+                assert(diff<1e-12)
+
+    def test_detect_phi_arm_angle(self):
+        template = fitsio.read(resource_filename('desimeter',"data/fiber_arm_outline.fits")).astype(float)
+        pad = template.shape[0]//2
+        # the template is the outline of the arm, so the image contains the filled arm
+        arm = binary_fill_holes(template>0).astype(float)
+        true_angle = 37.
+        rng = np.random.RandomState(2)
+        image = rng.normal(100,5,(4*pad,4*pad))
+        image[pad:3*pad+1,pad:3*pad+1] += 500*rotate(arm,-true_angle)
+        for ang_step in [1.,0.7] :
+            angle, ccfval = detect_phi_arm(2*pad,2*pad,image,template,ang_step)[:2]
+            angle_deg = np.rad2deg(angle)+90
+            assert(np.abs(angle_deg-true_angle)<=ang_step)
+            assert(ccfval>0.4)
+            # the returned angle is the one of the template that matched
+            k = angle_deg/ang_step
+            assert(np.abs(k-np.round(k))<1e-6)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,7 @@ from pkg_resources import resource_filename
 from collections import Counter
 
 import numpy as np
-from desimeter.circles import fit_circle,robust_fit_circle
+from desimeter.circles import fit_circle,fit_circles,robust_fit_circle
 
 class TestCircles(unittest.TestCase):
 
@@ -43,6 +43,70 @@ class TestCircles(unittest.TestCase):
         assert(np.abs(rfit-r)<1e-6)
         assert(nbad==1)
 
+     def test_fit_circles(self):
+        print("Testing fit circles")
+        np.random.seed(12)
+        nn=np.array([12,20,7,2])
+        xc=np.array([12.,-200.,301.,0.])
+        yc=np.array([24.,150.,-40.,0.])
+        r=np.array([3.,1.5,4.,2.])
+        x=[]
+        y=[]
+        for i in range(nn.size) :
+            a=np.random.uniform(0,2*np.pi,nn[i])
+            x.append(xc[i]+r[i]*np.cos(a)+np.random.normal(size=nn[i])*0.01)
+            y.append(yc[i]+r[i]*np.sin(a)+np.random.normal(size=nn[i])*0.01)
+        ends=np.cumsum(nn)
+        starts=ends-nn
+
+        xfit,yfit,rfit = fit_circles(np.hstack(x),np.hstack(y),starts,ends)
+        print(xfit,yfit,rfit)
+        for i in range(nn.size-1) :
+            # same result as the single circle fit
+            xfit1,yfit1,rfit1 = fit_circle(x[i],y[i])
+            assert(np.abs(xfit[i]-xfit1)<1e-6)
+            assert(np.abs(yfit[i]-yfit1)<1e-6)
+            assert(np.abs(rfit[i]-rfit1)<1e-6)
+            assert(np.abs(xfit[i]-xc[i])<0.02)
+            assert(np.abs(yfit[i]-yc[i])<0.02)
+            assert(np.abs(rfit[i]-r[i])<0.02)
+        # not enough points
+        assert(np.isnan(rfit[-1]))
+
+     def test_fit_circles_short_arcs(self):
+        print("Testing fit circles on short arcs")
+        np.random.seed(13)
+        nsets=200
+        nn=np.random.randint(6,15,nsets)
+        x=[]
+        y=[]
+        for i in range(nsets) :
+            span=np.deg2rad(np.random.uniform(10,90))
+            a=np.random.uniform(0,2*np.pi)+np.random.uniform(0,span,nn[i])
+            r=np.random.uniform(2.5,3.5)
+            xc,yc=np.random.uniform(-400,400,2)
+            x.append(xc+r*np.cos(a)+np.random.normal(size=nn[i])*0.01)
+            y.append(yc+r*np.sin(a)+np.random.normal(size=nn[i])*0.01)
+        ends=np.cumsum(nn)
+        starts=ends-nn
+
+        xfit,yfit,rfit = fit_circles(np.hstack(x),np.hstack(y),starts,ends)
+        nfit=0
+        for i in range(nsets) :
+            # same fits rejected and same result as the single circle fit
+            try :
+                xfit1,yfit1,rfit1 = fit_circle(x[i],y[i])
+            except ValueError :
+                assert(np.isnan(rfit[i]))
+                continue
+            nfit += 1
+            assert(np.abs(xfit[i]-xfit1)<1e-6)
+            assert(np.abs(yfit[i]-yfit1)<1e-6)
+            assert(np.abs(rfit[i]-rfit1)<1e-6)
+        print("{}/{} fits".format(nfit,nsets))
+        # some of the fits are rejected, but not all
+        assert(nfit>0 and nfit<nsets)
+
 
 
 if __name__ == '__main__':
@@ -22,6 +22,19 @@ class TestMatch(unittest.TestCase):
         dist=np.sqrt( (x1-x2[ii2])**2+(y1-y2[ii2])**2 )
         assert(np.all(dist==0.))
 
+    def test_same_coordinate_system_max_distance(self):
+        print("Testing match in same coordinate system with duplicates and max distance")
+        x1=np.array([0.,0.12,5.,10.])
+        y1=np.zeros(4)
+        x2=np.array([0.05,4.,10.5])
+        y2=np.zeros(3)
+        indices_2,distances = match_same_system(x1,y1,x2,y2,max_distance=0.8)
+        # 0 and 1 both match 0, the closest one is kept
+        # 2 is too far from 1
+        assert(np.all(indices_2==[0,-1,-1,2]))
+        assert(np.all(np.isinf(distances[1:3])))
+        assert(np.abs(distances[3]-0.5)<1e-12)
+
     def test_arbitrary_translation_dilatation(self):
         print("Testing match with arbitrary translation and dilatation")
         x1,y1,x2,y2 = self.x1y1x2y2(nn=30)
@@ -154,7 +154,7 @@ def make_covar_gradwavefront_nonoise(x1, y1, x2, y2, param, rq=False, **kw):
     covar = np.empty((n2*2, n1*2), dtype='f4')
     covar[:n2, :n1] = (1-xdist*xdist)*gauss
     covar[n2:, :n1] = -xdist*ydist*gauss
-    covar[:n2, n1:] = -xdist*ydist*gauss
+    covar[:n2, n1:] = covar[n2:, :n1]
     covar[n2:, n1:] = (1-ydist*ydist)*gauss
     return covar
 
@@ -173,7 +173,9 @@ def make_covar_gradwavefront(data, param, rq=False, **kw):
     covar = make_covar_gradwavefront_nonoise(
         data['x'], data['y'], data['x'], data['y'], param, rq=rq)
     sigma = param[0]
-    covar += np.diag(np.full(covar.shape[0], sigma**2))
+    # add the noise in float64 and round once when storing in covar
+    diag = np.diag_indices_from(covar)
+    covar[diag] = covar[diag].astype('f8') + sigma**2
     return covar
 
 
@@ -592,7 +594,8 @@ def solve_gradwavefront(data, excludeself=False, predict_at=None,
         else:
             # remove measurement noise contribution to covar
             cninv = np.eye(len(dvec))*res.x[0]**(-2)
-            covar -= np.eye(len(dvec))*res.x[0]**2
+            diag = np.diag_indices_from(covar)
+            covar[diag] = covar[diag].astype('f8') - res.x[0]**2
             cpcninv = np.dot(covar, cninv)
             aa = cpcninv+np.eye(len(dvec))
             turb = np.linalg.solve(aa, np.dot(cpcninv, dvec))